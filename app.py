@@ -1,73 +1,103 @@
-from flask import Flask, jsonify
+from flask import Blueprint, Flask, jsonify, request
 import logging
 import os
+import time
 from dotenv import load_dotenv
-from services.gemini_service import GeminiService
-from services.database_service import DatabaseService
 from services.batch_processor import BatchProcessor
+from services.logging_config import configurar_logging
+from services.service_container import get_database_service, get_gemini_service
 
-load_dotenv()
-
-app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('resumen_llamadas.log'),
-        logging.StreamHandler()
-    ]
-)
+bp = Blueprint('resumenes', __name__)
 
-logger = logging.getLogger(__name__)
+def _batch_processor() -> BatchProcessor:
+    return BatchProcessor(db_service=get_database_service(), gemini_service=get_gemini_service())
 
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "message": "Sistema de resumen de llamadas activo"})
 
-@app.route('/procesar-resumenes', methods=['POST'])
+@bp.route('/procesar-resumenes', methods=['POST'])
 def procesar_resumenes():
     try:
-        batch_processor = BatchProcessor()
-        resultado = batch_processor.procesar_consultas_pendientes()
+        resultado = _batch_processor().procesar_consultas_pendientes()
         return jsonify(resultado)
     except Exception as e:
-        logger.error(f"Error en procesamiento batch: {str(e)}")
+        logger.exception("Error en procesamiento batch: %s", e)
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/stats', methods=['GET'])
+@bp.route('/stats', methods=['GET'])
 def get_stats():
     try:
-        db_service = DatabaseService()
-        stats = db_service.obtener_estadisticas()
+        stats = get_database_service().obtener_estadisticas()
         return jsonify(stats)
     except Exception as e:
-        logger.error(f"Error obteniendo estadísticas: {str(e)}")
+        logger.exception("Error obteniendo estadísticas: %s", e)
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/procesar-consulta/<int:consulta_id>', methods=['POST'])
+@bp.route('/procesar-consulta/<int:consulta_id>', methods=['POST'])
 def procesar_consulta_individual(consulta_id):
     try:
-        batch_processor = BatchProcessor()
-        resultado = batch_processor.procesar_consulta_individual(consulta_id)
+        resultado = _batch_processor().procesar_consulta_individual(consulta_id)
         return jsonify(resultado)
     except Exception as e:
-        logger.error(f"Error procesando consulta individual {consulta_id}: {str(e)}")
+        logger.exception("Error procesando consulta individual %s: %s", consulta_id, e)
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/test-gemini', methods=['GET'])
+@bp.route('/buscar-consultas', methods=['GET'])
+def buscar_consultas():
+    equipo = request.args.get('equipo')
+    requerimiento = request.args.get('requerimiento')
+    asesor = request.args.get('asesor')
+    limite = max(1, min(request.args.get('limite', 50, type=int), 500))
+    
+    if not (equipo or requerimiento or asesor):
+        return jsonify({"error": "Indica al menos uno de: equipo, requerimiento, asesor"}), 400
+    
+    try:
+        consultas = get_database_service().buscar_consultas(equipo, requerimiento, asesor, limite)
+        return jsonify({"total": len(consultas), "consultas": consultas})
+    except ValueError as e:
+        # Términos sin palabras buscables (p. ej. '---')
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error buscando consultas: %s", e)
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@bp.route('/test-gemini', methods=['GET'])
 def test_gemini():
     try:
-        gemini_service = GeminiService()
-        conexion_ok = gemini_service.test_conexion()
+        gemini_service = get_gemini_service()
+        estado = gemini_service.test_conexion_cacheado()
         return jsonify({
-            "gemini_conectado": conexion_ok,
-            "modelo": gemini_service.model_name
+            "gemini_conectado": estado["conectado"],
+            "modelo": gemini_service.model_name,
+            "en_cache": estado["en_cache"],
+            "edad_segundos": estado["edad_segundos"]
         })
     except Exception as e:
-        logger.error(f"Error en test de Gemini: {str(e)}")
+        logger.exception("Error en test de Gemini: %s", e)
         return jsonify({"error": "Error interno del servidor"}), 500
 
+def create_app() -> Flask:
+    """
+    Crea la aplicación. Los servicios (Gemini, MySQL) no se instancian aquí sino
+    en el primer uso dentro de cada worker, por lo que es seguro con `gunicorn --preload`.
+    """
+    inicio = time.perf_counter()
+    load_dotenv()
+    configurar_logging('resumen_llamadas.jsonl')
+    
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    
+    logger.info("Aplicación inicializada en %.3fs", time.perf_counter() - inicio,
+                extra={"stage": "arranque", "duration": round(time.perf_counter() - inicio, 3)})
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.getenv('FLASK_PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV') == 'development')
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Gunicorn carga este archivo automáticamente desde el directorio de trabajo
+
+def worker_exit(server, worker):
+    """Cierra la conexión MySQL de larga vida del worker al terminar"""
+    from services.service_container import cerrar_servicios
+    cerrar_servicios()
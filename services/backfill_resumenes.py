@@ -0,0 +1,35 @@
+import argparse
+import logging
+from dotenv import load_dotenv
+from .database_service import DatabaseService
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Migración + backfill de las tablas laterales del resumen. Se ejecuta fuera
+    del servidor web: puede tardar más que el timeout de un worker de gunicorn.
+    """
+    from .logging_config import configurar_logging
+    configurar_logging('resumen_llamadas.jsonl', rol='backfill')
+    
+    parser = argparse.ArgumentParser(description="Backfill de índices de resumen")
+    parser.add_argument("--desde-id", type=int, default=0,
+                        help="Reanudar a partir de este ID (el log registra el último lote confirmado)")
+    parser.add_argument("--tamano-lote", type=int, default=200, help="Consultas por transacción")
+    parser.add_argument("--reindexar", action="store_true",
+                        help="Reescribir también las consultas ya indexadas")
+    args = parser.parse_args()
+    
+    db_service = DatabaseService()
+    try:
+        db_service.asegurar_tablas_resumen()
+        stats = db_service.backfill_indices_resumen(args.desde_id, args.tamano_lote, args.reindexar)
+        logger.info("Backfill completado: %s", stats)
+    finally:
+        db_service.close()
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,8 @@ import time
 import logging
 import os
 from dotenv import load_dotenv
-from typing import Dict, List
-from .database_service import DatabaseService
+from typing import Dict, List, Optional
+from .database_service import MIN_LARGO_CONSULTA, PREFIJO_EN_PROCESO, DatabaseService
 from .gemini_service import GeminiService
 
 load_dotenv()
@@ -11,11 +11,95 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 class BatchProcessor:
-    def __init__(self):
-        self.db_service = DatabaseService()
-        self.gemini_service = GeminiService()
+    def __init__(self, db_service: Optional[DatabaseService] = None,
+                 gemini_service: Optional[GeminiService] = None):
+        # Con servicios inyectados (compartidos) la conexión no se cierra al terminar
+        self._cerrar_db = db_service is None
+        self.db_service = db_service or DatabaseService()
+        self.gemini_service = gemini_service or GeminiService()
         self.batch_delay = int(os.getenv('BATCH_DELAY_SECONDS', 5))
         
+    def _cerrar_db_si_propia(self):
+        if not self._cerrar_db:
+            return
+        try:
+            self.db_service.close()
+        except:
+            pass
+    
+    def procesar_consulta(self, consulta: Dict, stats: Dict):
+        """Genera y guarda el resumen de una consulta, acumulando el resultado en stats"""
+        consulta_id = consulta['id']
+        consulta_texto = consulta['consulta']
+        
+        inicio_item = time.time()
+        reclamada = False
+        try:
+            # Validar que hay texto para procesar
+            if not consulta_texto or len(consulta_texto.strip()) < MIN_LARGO_CONSULTA:
+                logger.warning("Consulta ID %s tiene texto muy corto o vacío", consulta_id,
+                               extra={"consulta_id": consulta_id, "stage": "validacion"})
+                stats["saltadas"] += 1
+                return
+            
+            # Reclamar la consulta para que otro proceso (watcher/batch) no la duplique
+            reclamada = self.db_service.reclamar_consulta(consulta_id)
+            if not reclamada:
+                logger.info("Consulta %s ya reclamada o resumida por otro proceso", consulta_id,
+                            extra={"consulta_id": consulta_id, "stage": "reclamo"})
+                stats["saltadas"] += 1
+                return
+            
+            # Generar resumen con Gemini
+            resumen = self.gemini_service.generar_resumen(consulta_texto, consulta_id)
+            
+            if resumen:
+                # Actualizar en base de datos
+                if self.db_service.actualizar_resumen(consulta_id, resumen):
+                    stats["procesadas_exitosamente"] += 1
+                    logger.info("Consulta %s procesada exitosamente", consulta_id,
+                                extra={"consulta_id": consulta_id, "stage": "completado",
+                                       "duration": round(time.time() - inicio_item, 3),
+                                       "muestreo": True})
+                else:
+                    error_msg = f"Error actualizando resumen en BD para ID {consulta_id}"
+                    logger.error(error_msg, extra={"consulta_id": consulta_id, "stage": "guardado"})
+                    stats["errores"] += 1
+                    stats["detalles_errores"].append({
+                        "consulta_id": consulta_id,
+                        "error": error_msg
+                    })
+            else:
+                error_msg = f"Gemini no pudo generar resumen válido para ID {consulta_id}"
+                logger.error(error_msg, extra={"consulta_id": consulta_id, "stage": "generacion"})
+                
+                # Marcar error en BD
+                self.db_service.marcar_error_procesamiento(consulta_id, "Fallo generación resumen")
+                
+                stats["errores"] += 1
+                stats["detalles_errores"].append({
+                    "consulta_id": consulta_id,
+                    "error": error_msg
+                })
+        
+        except Exception as e:
+            error_msg = f"Error procesando consulta ID {consulta_id}: {str(e)}"
+            logger.exception(error_msg, extra={"consulta_id": consulta_id, "stage": "error",
+                                               "duration": round(time.time() - inicio_item, 3)})
+            
+            # Marcar error en BD sólo si este proceso llegó a reclamarla
+            if reclamada:
+                try:
+                    self.db_service.marcar_error_procesamiento(consulta_id, str(e))
+                except:
+                    logger.exception("No se pudo marcar error en BD para consulta %s", consulta_id)
+            
+            stats["errores"] += 1
+            stats["detalles_errores"].append({
+                "consulta_id": consulta_id,
+                "error": error_msg
+            })
+    
     def procesar_consultas_pendientes(self) -> Dict:
         """Procesa todas las consultas pendientes de resumen"""
         logger.info("Iniciando proceso batch de resúmenes de consultas")
@@ -44,66 +128,13 @@ class BatchProcessor:
                 stats["tiempo_total"] = round(time.time() - inicio_tiempo, 2)
                 return stats
             
-            logger.info(f"Procesando {len(consultas_pendientes)} consultas pendientes")
+            logger.info("Procesando %d consultas pendientes", len(consultas_pendientes))
             
             # Procesar cada consulta
             for i, consulta in enumerate(consultas_pendientes, 1):
-                consulta_id = consulta['id']
-                consulta_texto = consulta['consulta']
-                
-                try:
-                    logger.info(f"Procesando consulta {i}/{len(consultas_pendientes)} - ID: {consulta_id}")
-                    
-                    # Validar que hay texto para procesar
-                    if not consulta_texto or len(consulta_texto.strip()) < 10:
-                        logger.warning(f"Consulta ID {consulta_id} tiene texto muy corto o vacío")
-                        stats["saltadas"] += 1
-                        continue
-                    
-                    # Generar resumen con Gemini
-                    resumen = self.gemini_service.generar_resumen(consulta_texto, consulta_id)
-                    
-                    if resumen:
-                        # Actualizar en base de datos
-                        if self.db_service.actualizar_resumen(consulta_id, resumen):
-                            stats["procesadas_exitosamente"] += 1
-                            logger.info(f"✅ Consulta {consulta_id} procesada exitosamente")
-                        else:
-                            error_msg = f"Error actualizando resumen en BD para ID {consulta_id}"
-                            logger.error(error_msg)
-                            stats["errores"] += 1
-                            stats["detalles_errores"].append({
-                                "consulta_id": consulta_id,
-                                "error": error_msg
-                            })
-                    else:
-                        error_msg = f"Gemini no pudo generar resumen válido para ID {consulta_id}"
-                        logger.error(error_msg)
-                        
-                        # Marcar error en BD
-                        self.db_service.marcar_error_procesamiento(consulta_id, "Fallo generación resumen")
-                        
-                        stats["errores"] += 1
-                        stats["detalles_errores"].append({
-                            "consulta_id": consulta_id,
-                            "error": error_msg
-                        })
-                
-                except Exception as e:
-                    error_msg = f"Error procesando consulta ID {consulta_id}: {str(e)}"
-                    logger.error(error_msg)
-                    
-                    # Marcar error en BD
-                    try:
-                        self.db_service.marcar_error_procesamiento(consulta_id, str(e))
-                    except:
-                        logger.error(f"No se pudo marcar error en BD para consulta {consulta_id}")
-                    
-                    stats["errores"] += 1
-                    stats["detalles_errores"].append({
-                        "consulta_id": consulta_id,
-                        "error": error_msg
-                    })
+                logger.info("Procesando consulta %d/%d - ID: %s", i, len(consultas_pendientes), consulta['id'],
+                            extra={"consulta_id": consulta['id'], "stage": "inicio", "muestreo": True})
+                self.procesar_consulta(consulta, stats)
                 
                 # Delay entre procesamiento para no saturar APIs
                 if i < len(consultas_pendientes):  # No esperar después de la última
@@ -112,19 +143,17 @@ class BatchProcessor:
             stats["fin"] = time.strftime("%Y-%m-%d %H:%M:%S")
             stats["tiempo_total"] = round(time.time() - inicio_tiempo, 2)
             
-            logger.info(f"""
-            📊 PROCESO BATCH COMPLETADO:
-            - Total encontradas: {stats['total_encontradas']}
-            - Procesadas exitosamente: {stats['procesadas_exitosamente']}
-            - Errores: {stats['errores']}
-            - Saltadas: {stats['saltadas']}
-            - Tiempo total: {stats['tiempo_total']}s
-            """)
+            logger.info(
+                "Proceso batch completado: encontradas=%d exitosas=%d errores=%d saltadas=%d",
+                stats['total_encontradas'], stats['procesadas_exitosamente'],
+                stats['errores'], stats['saltadas'],
+                extra={"stage": "batch_completado", "duration": stats['tiempo_total']}
+            )
             
             return stats
             
         except Exception as e:
-            logger.error(f"Error crítico en proceso batch: {e}")
+            logger.exception("Error crítico en proceso batch: %s", e)
             stats["error_critico"] = str(e)
             stats["fin"] = time.strftime("%Y-%m-%d %H:%M:%S")
             stats["tiempo_total"] = round(time.time() - inicio_tiempo, 2)
@@ -132,37 +161,46 @@ class BatchProcessor:
         
         finally:
             # Cerrar conexión a BD
-            try:
-                self.db_service.close()
-            except:
-                pass
+            self._cerrar_db_si_propia()
     
     def procesar_consulta_individual(self, consulta_id: int) -> Dict:
         """Procesa una consulta específica por ID"""
-        logger.info(f"Procesando consulta individual ID: {consulta_id}")
+        logger.info("Procesando consulta individual ID: %s", consulta_id)
         
+        reclamada = False
         try:
             # Obtener consulta específica
             cursor = self.db_service.connection.cursor(dictionary=True)
             query = """
-            SELECT id, registro_id, asesor_nombre, consulta, fecha_consulta 
+            SELECT id, registro_id, asesor_nombre, consulta, fecha_consulta, resumen 
             FROM expokossodo_consultas 
             WHERE id = %s AND uso_transcripcion = 1
             """
             cursor.execute(query, (consulta_id,))
             consulta = cursor.fetchone()
             cursor.close()
+            # Cierra el snapshot de lectura de la conexión (puede ser compartida)
+            self.db_service.connection.commit()
             
             if not consulta:
                 return {
                     "error": f"Consulta ID {consulta_id} no encontrada o no habilitada para transcripción"
                 }
             
+            # Si está pendiente se reclama; si ya tiene resumen se regenera sin reclamo
+            if not consulta['resumen'] or consulta['resumen'].startswith(PREFIJO_EN_PROCESO):
+                reclamada = self.db_service.reclamar_consulta(consulta_id)
+                if not reclamada:
+                    return {
+                        "error": f"Consulta ID {consulta_id} ya está siendo procesada"
+                    }
+            
             # Generar resumen
             resumen = self.gemini_service.generar_resumen(consulta['consulta'], consulta_id)
             
             if resumen:
                 if self.db_service.actualizar_resumen(consulta_id, resumen):
+                    reclamada = False
                     return {
                         "exito": True,
                         "consulta_id": consulta_id,
@@ -178,12 +216,12 @@ class BatchProcessor:
                 }
                 
         except Exception as e:
-            logger.error(f"Error procesando consulta individual {consulta_id}: {e}")
+            logger.exception("Error procesando consulta individual %s: %s", consulta_id, e)
             return {
                 "error": str(e)
             }
         finally:
-            try:
-                self.db_service.close()
-            except:
-                pass
\ No newline at end of file
+            # Si no se guardó el resumen, la consulta vuelve a quedar pendiente
+            if reclamada:
+                self.db_service.liberar_consulta(consulta_id)
+            self._cerrar_db_si_propia()
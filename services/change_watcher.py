@@ -0,0 +1,245 @@
+import time
+import queue
+import signal
+import logging
+import os
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from typing import Dict, Optional
+from .batch_processor import BatchProcessor
+from .gemini_service import GeminiService
+from .service_container import cerrar_servicios, get_database_service, get_gemini_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class ConsultaWatcher:
+    """
+    Sigue las consultas nuevas con una marca de agua (id, o timestamp + id) y las
+    entrega a una cola acotada que alimenta al procesador de forma continua.
+
+    Cada sondeo lee el tope actual (MAX(id) o MAX(timestamp)) y recorre sólo el
+    rango (marca, tope]; si no llena la página, la marca salta al tope aunque no
+    haya filas pendientes, así el rango recorrido no crece en estado estable.
+    En modo id se vuelven a mirar los últimos WATCHER_REESCANEO_IDS ids detrás de
+    la marca, para recoger ids bajos que confirman tarde. Las filas que cambian
+    después de salir de esa ventana (uso_transcripcion o texto actualizados) sólo
+    las recoge /procesar-resumenes, que sigue siendo el barrido completo.
+
+    La cola acotada es la contrapresión: el consumidor avanza al ritmo del rate
+    limit de Gemini y, cuando la cola está llena, el sondeo no lee más filas.
+    Cada consulta se reclama en BD antes de procesarla (ver
+    DatabaseService.reclamar_consulta), por lo que el watcher puede convivir con
+    /procesar-resumenes y /procesar-consulta sin duplicar llamadas a Gemini.
+    """
+
+    def __init__(self, gemini_service: Optional[GeminiService] = None):
+        self.gemini_service = gemini_service
+        self.poll_interval = float(os.getenv('WATCHER_POLL_SECONDS', 5))
+        self.columna_timestamp = os.getenv('WATCHER_TIMESTAMP_COLUMN') or None
+        self.ventana_reescaneo = int(os.getenv('WATCHER_REESCANEO_IDS', 200))
+        self.batch_delay = int(os.getenv('BATCH_DELAY_SECONDS', 5))
+        self.stats_interval = float(os.getenv('WATCHER_STATS_SECONDS', 300))
+        self.cola = queue.Queue(maxsize=int(os.getenv('WATCHER_QUEUE_SIZE', 20)))
+
+        # Marca de agua: hasta dónde ya se recorrió la tabla
+        self.marca_id = int(os.getenv('WATCHER_START_ID', 0))
+        self.marca_timestamp = None
+
+        # IDs encolados o en proceso, para no duplicar si una fila se actualiza
+        self._en_curso = set()
+        self._en_curso_lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilos = []
+
+        self.stats = {
+            "inicio": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "sondeos": 0,
+            "encoladas": 0,
+            "procesadas_exitosamente": 0,
+            "errores": 0,
+            "saltadas": 0,
+            "detalles_errores": deque(maxlen=100)
+        }
+
+    def iniciar(self):
+        """Arranca los hilos de sondeo y de procesamiento"""
+        if self._hilos:
+            return
+        self._detener.clear()
+        self._hilos = [
+            threading.Thread(target=self._sondear, name="watcher-sondeo", daemon=True),
+            threading.Thread(target=self._consumir, name="watcher-consumidor", daemon=True)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+        logger.info("Watcher iniciado (marca id=%s, columna timestamp=%s, cola=%d)",
+                    self.marca_id, self.columna_timestamp, self.cola.maxsize)
+
+    def solicitar_detencion(self):
+        """Pide a los hilos que terminen sin esperarlos (seguro desde un handler de señal)"""
+        self._detener.set()
+
+    def detener(self, timeout: Optional[float] = None):
+        """Detiene los hilos; la consulta en curso termina antes de salir"""
+        self.solicitar_detencion()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+        logger.info("Watcher detenido: %s", self.resumen_stats())
+
+    def resumen_stats(self) -> Dict:
+        """Copia serializable de las estadísticas y la marca de agua actual"""
+        stats = dict(self.stats)
+        stats["detalles_errores"] = list(self.stats["detalles_errores"])
+        stats["en_cola"] = self.cola.qsize()
+        stats["marca_id"] = self.marca_id
+        stats["marca_timestamp"] = self.marca_timestamp
+        return stats
+
+    def ejecutar(self):
+        """Modo bloqueante para correr el watcher como proceso propio"""
+        self.iniciar()
+        try:
+            while not self._detener.wait(self.stats_interval):
+                logger.info("Estadísticas del watcher: %s", self.resumen_stats(),
+                            extra={"stage": "watcher_stats"})
+        finally:
+            self.detener()
+
+    def _sondear(self):
+        try:
+            while not self._detener.is_set():
+                libres = self.cola.maxsize - self.cola.qsize()
+                if libres <= 0:
+                    # Contrapresión: el consumidor va al límite del rate limit
+                    logger.debug("Cola del watcher llena, se pospone el sondeo")
+                    self._detener.wait(self.poll_interval)
+                    continue
+
+                try:
+                    pagina_completa = self._sondear_rango(libres)
+                except Exception as e:
+                    logger.exception("Error sondeando consultas nuevas: %s", e)
+                    self._detener.wait(self.poll_interval)
+                    continue
+
+                # Página completa: hay más filas atrasadas, seguir sin esperar
+                if not pagina_completa:
+                    self._detener.wait(self.poll_interval)
+        finally:
+            cerrar_servicios()
+
+    def _sondear_rango(self, libres: int) -> bool:
+        """Encola las pendientes de (marca, tope] y avanza la marca; indica si llenó la página"""
+        db_service = get_database_service()
+        tope = db_service.get_marca_maxima(self.columna_timestamp)
+        if tope is None:
+            return False
+
+        desde_id = self.marca_id
+        if not self.columna_timestamp:
+            # Ventana detrás de la marca para ids bajos que confirman tarde
+            desde_id = max(0, self.marca_id - self.ventana_reescaneo)
+            if desde_id >= tope:
+                return False
+        elif self.marca_timestamp is not None and self.marca_timestamp > tope:
+            return False
+
+        # Las ya encoladas no se releen: si no, ocuparían la página en cada sondeo
+        with self._en_curso_lock:
+            en_curso = list(self._en_curso)
+        consultas = db_service.get_consultas_nuevas(
+            desde_id, tope, libres, self.columna_timestamp, self.marca_timestamp, en_curso
+        )
+        self.stats["sondeos"] += 1
+
+        encoladas = 0
+        for consulta in consultas:
+            marca_timestamp = consulta.pop('marca_timestamp', None)
+            with self._en_curso_lock:
+                if consulta['id'] in self._en_curso:
+                    continue
+                self._en_curso.add(consulta['id'])
+            consulta['detectada_en'] = time.time()
+            self.cola.put(consulta)
+            encoladas += 1
+            self.stats["encoladas"] += 1
+            logger.info("Consulta %s encolada por el watcher", consulta['id'],
+                        extra={"consulta_id": consulta['id'], "stage": "encolada", "muestreo": True})
+            if self.columna_timestamp:
+                self.marca_id = consulta['id']
+                self.marca_timestamp = marca_timestamp
+            else:
+                self.marca_id = max(self.marca_id, consulta['id'])
+
+        if len(consultas) >= libres:
+            # Quedan filas en el rango; si ninguna se encoló se espera al próximo sondeo
+            return encoladas > 0
+
+        # Todo (marca, tope] quedó recorrido, haya o no filas pendientes
+        if self.columna_timestamp:
+            # Se vuelve a mirar el último instante (filas con el mismo timestamp
+            # pueden llegar después); reclamar_consulta evita reprocesarlas
+            self.marca_timestamp = tope
+            self.marca_id = 0
+        else:
+            self.marca_id = max(self.marca_id, tope)
+        return False
+
+    def _consumir(self):
+        try:
+            self._consumir_cola()
+        finally:
+            cerrar_servicios()
+
+    def _consumir_cola(self):
+        procesador = None
+        while not self._detener.is_set():
+            try:
+                consulta = self.cola.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                if procesador is None:
+                    procesador = BatchProcessor(
+                        db_service=get_database_service(),
+                        gemini_service=self.gemini_service or get_gemini_service()
+                    )
+                else:
+                    procesador.db_service = get_database_service()
+                procesador.procesar_consulta(consulta, self.stats)
+                logger.info("Consulta %s resumida por el watcher", consulta['id'],
+                            extra={"consulta_id": consulta['id'], "stage": "watcher_completado",
+                                   "duration": round(time.time() - consulta['detectada_en'], 3),
+                                   "muestreo": True})
+            except Exception as e:
+                logger.exception("Error en consumidor del watcher para consulta %s: %s", consulta['id'], e)
+            finally:
+                with self._en_curso_lock:
+                    self._en_curso.discard(consulta['id'])
+                self.cola.task_done()
+
+            # Delay entre consultas sólo si hay más trabajo en cola
+            if self.batch_delay and not self.cola.empty():
+                self._detener.wait(self.batch_delay)
+
+def main():
+    from .logging_config import configurar_logging
+    configurar_logging('resumen_llamadas.jsonl', rol='watcher')
+
+    watcher = ConsultaWatcher()
+
+    def _terminar(signum, frame):
+        logger.info("Señal %s recibida, deteniendo watcher", signum)
+        watcher.solicitar_detencion()
+
+    signal.signal(signal.SIGTERM, _terminar)
+    signal.signal(signal.SIGINT, _terminar)
+    watcher.ejecutar()
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,94 @@
 import mysql.connector
 from mysql.connector import Error
+import json
 import os
+import re
+import time
+import unicodedata
 from dotenv import load_dotenv
 import logging
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Campos de lista del resumen que se normalizan en tablas laterales indexadas
+CAMPOS_LISTA_RESUMEN = (
+    "requerimientos_cliente",
+    "detalles_tecnicos",
+    "equipos_modelos",
+    "metricas_uso",
+    "acciones_recomendadas"
+)
+
+TABLA_RESUMEN_GENERAL = "expokossodo_resumen_general"
+TABLA_RESUMEN_TOKENS = "expokossodo_resumen_tokens"
+
+# Longitud máxima indexable (utf8mb4) para los valores normalizados
+MAX_VALOR_NORMALIZADO = 255
+MAX_TOKEN = 100
+
+# Marca de reclamo: 'EN_PROCESO:' + epoch de 10 dígitos (comparable como texto)
+PREFIJO_EN_PROCESO = "EN_PROCESO:"
+CLAIM_TIMEOUT_SECONDS = int(os.getenv('CLAIM_TIMEOUT_SECONDS', 1800))
+
+# Consultas más cortas se saltan sin llamar a Gemini
+MIN_LARGO_CONSULTA = 10
+
+def _marca_en_proceso(momento: float) -> str:
+    return f"{PREFIJO_EN_PROCESO}{int(momento):010d}"
+
+def _marca_en_proceso_vencida() -> str:
+    return _marca_en_proceso(time.time() - CLAIM_TIMEOUT_SECONDS)
+
+def _validar_columna(columna: str) -> str:
+    if not re.fullmatch(r'\w+', columna):
+        raise ValueError(f"Nombre de columna inválido: {columna}")
+    return columna
+
+def tabla_campo_resumen(campo: str) -> str:
+    return f"expokossodo_resumen_{campo}"
+
+def serializar_resumen(resumen_dict: Dict) -> str:
+    """Serializa el resumen en forma compacta (sin indentación)"""
+    return json.dumps(resumen_dict, ensure_ascii=False, separators=(',', ':'))
+
+def normalizar_valor(valor) -> str:
+    """Normaliza un valor para búsquedas: minúsculas y espacios colapsados"""
+    return " ".join(str(valor).split()).lower()[:MAX_VALOR_NORMALIZADO]
+
+def _sin_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+def tokenizar_valor(valor) -> List[str]:
+    """
+    Tokens únicos (minúsculas, sin acentos) de un valor. Los códigos compuestos
+    se indexan completos y por partes: 'TP-Link' -> ['tp-link', 'tp', 'link'].
+    """
+    tokens = []
+    for compuesto in re.findall(r'\w+(?:[-./]\w+)*', _sin_acentos(str(valor).lower())):
+        partes = re.split(r'[-./]', compuesto)
+        for token in ([compuesto] + partes if len(partes) > 1 else partes):
+            token = token[:MAX_TOKEN]
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+def _patron_prefijo(termino: str) -> str:
+    """Construye un patrón LIKE de prefijo (aprovecha el índice) escapando comodines"""
+    termino = normalizar_valor(termino)
+    termino = termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{termino}%"
+
 class DatabaseService:
+    # El resultado positivo se cachea para siempre; el negativo sólo
+    # INDICES_RECHEQUEO_SEGUNDOS, para activar las escrituras laterales tras la
+    # migración sin reiniciar y sin consultar information_schema en cada consulta
+    _indices_resumen_disponibles = False
+    _indices_resumen_ausentes_hasta = 0.0
+    INDICES_RECHEQUEO_SEGUNDOS = 300
+
     def __init__(self):
         self.connection = None
         self.connect()
@@ -28,8 +107,134 @@ class DatabaseService:
             if self.connection.is_connected():
                 logger.info("Conexión exitosa a MySQL")
         except Error as e:
-            logger.error(f"Error conectando a MySQL: {e}")
+            logger.exception("Error conectando a MySQL: %s", e)
+            raise
+    
+    def asegurar_conexion(self):
+        """Reabre la conexión si se cerró o expiró; usada por instancias compartidas"""
+        if self.connection is None:
+            self.connect()
+            return
+        try:
+            self.connection.ping(reconnect=True, attempts=3, delay=1)
+        except Error as e:
+            logger.warning("Reconectando a MySQL tras fallo de ping: %s", e)
+            self.connect()
+    
+    def _terminar_lectura(self):
+        """
+        Cierra la transacción implícita de una lectura. Con REPEATABLE READ una
+        conexión reutilizada seguiría viendo el snapshot de su primera consulta.
+        """
+        self.connection.commit()
+    
+    def asegurar_tablas_resumen(self):
+        """Crea las tablas laterales del resumen normalizado (migración, requiere permisos DDL)"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLA_RESUMEN_GENERAL} (
+                consulta_id INT NOT NULL PRIMARY KEY,
+                asesor_nombre VARCHAR(255) DEFAULT NULL,
+                resumen_general TEXT,
+                INDEX idx_asesor_nombre (asesor_nombre)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            for campo in CAMPOS_LISTA_RESUMEN:
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla_campo_resumen(campo)} (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    consulta_id INT NOT NULL,
+                    posicion SMALLINT NOT NULL,
+                    valor TEXT NOT NULL,
+                    valor_normalizado VARCHAR({MAX_VALOR_NORMALIZADO}) NOT NULL,
+                    INDEX idx_valor_normalizado (valor_normalizado),
+                    INDEX idx_consulta_id (consulta_id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """)
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLA_RESUMEN_TOKENS} (
+                consulta_id INT NOT NULL,
+                campo VARCHAR(40) NOT NULL,
+                token VARCHAR({MAX_TOKEN}) NOT NULL,
+                PRIMARY KEY (campo, token, consulta_id),
+                INDEX idx_consulta_id (consulta_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            self.connection.commit()
+            DatabaseService._indices_resumen_disponibles = True
+        except Error as e:
+            logger.exception("Error creando tablas de resumen normalizado: %s", e)
+            self.connection.rollback()
             raise
+        finally:
+            cursor.close()
+    
+    def indices_resumen_disponibles(self) -> bool:
+        """Indica si existen las tablas laterales (creadas por services.backfill_resumenes)"""
+        if DatabaseService._indices_resumen_disponibles:
+            return True
+        if time.time() < DatabaseService._indices_resumen_ausentes_hasta:
+            return False
+        cursor = self.connection.cursor()
+        try:
+            tablas = [TABLA_RESUMEN_GENERAL, TABLA_RESUMEN_TOKENS] + [tabla_campo_resumen(c) for c in CAMPOS_LISTA_RESUMEN]
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name IN ({", ".join(["%s"] * len(tablas))})
+            """, tablas)
+            disponibles = cursor.fetchone()[0] == len(tablas)
+        except Error as e:
+            logger.warning("No se pudo verificar las tablas de resumen normalizado: %s", e)
+            disponibles = False
+        finally:
+            cursor.close()
+        
+        if disponibles:
+            DatabaseService._indices_resumen_disponibles = True
+        else:
+            DatabaseService._indices_resumen_ausentes_hasta = time.time() + self.INDICES_RECHEQUEO_SEGUNDOS
+            logger.warning("Tablas de resumen normalizado ausentes; ejecuta python -m services.backfill_resumenes")
+        return disponibles
+    
+    def _borrar_indices_resumen(self, cursor, consulta_id: int):
+        cursor.execute(f"DELETE FROM {TABLA_RESUMEN_GENERAL} WHERE consulta_id = %s", (consulta_id,))
+        cursor.execute(f"DELETE FROM {TABLA_RESUMEN_TOKENS} WHERE consulta_id = %s", (consulta_id,))
+        for campo in CAMPOS_LISTA_RESUMEN:
+            cursor.execute(f"DELETE FROM {tabla_campo_resumen(campo)} WHERE consulta_id = %s", (consulta_id,))
+    
+    def _escribir_indices_resumen(self, cursor, consulta_id: int, resumen_dict: Dict):
+        """Reemplaza las filas laterales de una consulta; no hace commit"""
+        self._borrar_indices_resumen(cursor, consulta_id)
+        
+        cursor.execute(f"""
+            INSERT INTO {TABLA_RESUMEN_GENERAL} (consulta_id, asesor_nombre, resumen_general)
+            SELECT id, asesor_nombre, %s FROM expokossodo_consultas WHERE id = %s
+        """, (resumen_dict.get("resumen_general"), consulta_id))
+        
+        for campo in CAMPOS_LISTA_RESUMEN:
+            filas = [
+                (consulta_id, posicion, str(valor), normalizar_valor(valor))
+                for posicion, valor in enumerate(resumen_dict.get(campo) or [])
+                if str(valor).strip()
+            ]
+            if filas:
+                cursor.executemany(f"""
+                    INSERT INTO {tabla_campo_resumen(campo)}
+                    (consulta_id, posicion, valor, valor_normalizado)
+                    VALUES (%s, %s, %s, %s)
+                """, filas)
+            
+            tokens = []
+            for _, _, valor, _ in filas:
+                for token in tokenizar_valor(valor):
+                    if token not in tokens:
+                        tokens.append(token)
+            if tokens:
+                cursor.executemany(f"""
+                    INSERT IGNORE INTO {TABLA_RESUMEN_TOKENS} (consulta_id, campo, token)
+                    VALUES (%s, %s, %s)
+                """, [(consulta_id, campo, token) for token in tokens])
     
     def get_consultas_pendientes(self) -> List[Dict]:
         cursor = self.connection.cursor(dictionary=True)
@@ -38,20 +243,135 @@ class DatabaseService:
             SELECT id, registro_id, asesor_nombre, consulta, fecha_consulta 
             FROM expokossodo_consultas 
             WHERE uso_transcripcion = 1 
-            AND (resumen IS NULL OR resumen = '')
+            AND (resumen IS NULL OR resumen = '' OR (resumen LIKE %s AND resumen < %s))
             ORDER BY fecha_consulta ASC
             """
-            cursor.execute(query)
+            # Incluye reclamos abandonados (proceso caído a mitad de una consulta)
+            cursor.execute(query, (PREFIJO_EN_PROCESO + '%', _marca_en_proceso_vencida()))
             consultas = cursor.fetchall()
-            logger.info(f"Encontradas {len(consultas)} consultas pendientes de procesar")
+            self._terminar_lectura()
+            logger.info("Encontradas %s consultas pendientes de procesar", len(consultas))
             return consultas
         except Error as e:
-            logger.error(f"Error obteniendo consultas pendientes: {e}")
+            logger.exception("Error obteniendo consultas pendientes: %s", e)
+            raise
+        finally:
+            cursor.close()
+    
+    def get_marca_maxima(self, columna_timestamp: Optional[str] = None):
+        """Tope actual de la tabla: MAX(id), o MAX(timestamp) si se indica la columna"""
+        columna = _validar_columna(columna_timestamp) if columna_timestamp else "id"
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT MAX({columna}) FROM expokossodo_consultas")
+            tope = cursor.fetchone()[0]
+            self._terminar_lectura()
+            return tope
+        except Error as e:
+            logger.exception("Error obteniendo marca máxima: %s", e)
             raise
         finally:
             cursor.close()
     
+    def get_consultas_nuevas(self, desde_id: int, hasta, limite: int, columna_timestamp: Optional[str] = None,
+                             desde_timestamp=None, excluir_ids: Iterable[int] = ()) -> List[Dict]:
+        """
+        Consultas pendientes dentro del rango (marca de agua, hasta]. La marca es el
+        id, o timestamp + id; `hasta` es un id o un timestamp según el modo. Recorre
+        sólo ese rango del índice en vez de toda la tabla. `excluir_ids` son las que
+        el llamador ya tiene en cola, y no cuentan para el límite de la página.
+        """
+        excluir_ids = list(excluir_ids)
+        filtro_excluidas = ""
+        if excluir_ids:
+            filtro_excluidas = f"AND id NOT IN ({', '.join(['%s'] * len(excluir_ids))})"
+        cursor = self.connection.cursor(dictionary=True)
+        try:
+            if columna_timestamp:
+                columna = _validar_columna(columna_timestamp)
+                query = f"""
+                SELECT id, registro_id, asesor_nombre, consulta, fecha_consulta,
+                       {columna} AS marca_timestamp
+                FROM expokossodo_consultas
+                WHERE ({columna} > %s OR ({columna} = %s AND id > %s))
+                AND {columna} <= %s
+                AND uso_transcripcion = 1
+                AND (resumen IS NULL OR resumen = '')
+                AND CHAR_LENGTH(TRIM(consulta)) >= %s
+                {filtro_excluidas}
+                ORDER BY {columna} ASC, id ASC
+                LIMIT %s
+                """
+                desde_timestamp = desde_timestamp or '1970-01-01 00:00:00'
+                params = (desde_timestamp, desde_timestamp, desde_id, hasta, MIN_LARGO_CONSULTA)
+            else:
+                query = f"""
+                SELECT id, registro_id, asesor_nombre, consulta, fecha_consulta
+                FROM expokossodo_consultas
+                WHERE id > %s AND id <= %s
+                AND uso_transcripcion = 1
+                AND (resumen IS NULL OR resumen = '')
+                AND CHAR_LENGTH(TRIM(consulta)) >= %s
+                {filtro_excluidas}
+                ORDER BY id ASC
+                LIMIT %s
+                """
+                params = (desde_id, hasta, MIN_LARGO_CONSULTA)
+            cursor.execute(query, params + tuple(excluir_ids) + (limite,))
+            consultas = cursor.fetchall()
+            self._terminar_lectura()
+            return consultas
+        except Error as e:
+            logger.exception("Error obteniendo consultas nuevas: %s", e)
+            raise
+        finally:
+            cursor.close()
+    
+    def reclamar_consulta(self, consulta_id: int) -> bool:
+        """
+        Marca atómicamente una consulta pendiente como EN_PROCESO. Sólo un proceso
+        (watcher, batch o endpoint individual) la obtiene; las marcas más viejas que
+        CLAIM_TIMEOUT_SECONDS se consideran abandonadas y pueden reclamarse.
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("""
+                UPDATE expokossodo_consultas
+                SET resumen = %s
+                WHERE id = %s
+                AND (resumen IS NULL OR resumen = '' OR (resumen LIKE %s AND resumen < %s))
+            """, (_marca_en_proceso(time.time()), consulta_id,
+                  PREFIJO_EN_PROCESO + '%', _marca_en_proceso_vencida()))
+            self.connection.commit()
+            return cursor.rowcount > 0
+        except Error as e:
+            logger.exception("Error reclamando consulta ID %s: %s", consulta_id, e)
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    def liberar_consulta(self, consulta_id: int) -> bool:
+        """Devuelve a pendiente una consulta reclamada que no se terminó de procesar"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("""
+                UPDATE expokossodo_consultas
+                SET resumen = NULL
+                WHERE id = %s AND resumen LIKE %s
+            """, (consulta_id, PREFIJO_EN_PROCESO + '%'))
+            self.connection.commit()
+            return cursor.rowcount > 0
+        except Error as e:
+            logger.exception("Error liberando consulta ID %s: %s", consulta_id, e)
+            self.connection.rollback()
+            return False
+        finally:
+            cursor.close()
+    
     def actualizar_resumen(self, consulta_id: int, resumen: str) -> bool:
+        """Guarda el resumen y sus tablas laterales en una misma transacción"""
+        resumen_dict = json.loads(resumen)
         cursor = self.connection.cursor()
         try:
             query = """
@@ -59,38 +379,52 @@ class DatabaseService:
             SET resumen = %s 
             WHERE id = %s
             """
-            cursor.execute(query, (resumen, consulta_id))
-            self.connection.commit()
+            cursor.execute(query, (serializar_resumen(resumen_dict), consulta_id))
             
             if cursor.rowcount > 0:
-                logger.info(f"Resumen actualizado para consulta ID: {consulta_id}")
+                if self.indices_resumen_disponibles():
+                    self._escribir_indices_resumen(cursor, consulta_id, resumen_dict)
+                self.connection.commit()
+                logger.info("Resumen actualizado para consulta ID: %s", consulta_id,
+                            extra={"consulta_id": consulta_id, "stage": "guardado", "muestreo": True})
                 return True
             else:
-                logger.warning(f"No se encontró consulta con ID: {consulta_id}")
+                self.connection.rollback()
+                logger.warning("No se encontró consulta con ID: %s", consulta_id)
                 return False
                 
         except Error as e:
-            logger.error(f"Error actualizando resumen para ID {consulta_id}: {e}")
+            logger.exception("Error actualizando resumen para ID %s: %s", consulta_id, e)
             self.connection.rollback()
             raise
         finally:
             cursor.close()
     
     def marcar_error_procesamiento(self, consulta_id: int, error_msg: str) -> bool:
+        """
+        Marca el error sólo si la consulta sigue reclamada (EN_PROCESO); nunca pisa
+        un resumen ni un reclamo que otro proceso haya escrito entretanto.
+        """
         cursor = self.connection.cursor()
         try:
             error_resumen = f"ERROR_PROCESAMIENTO: {error_msg[:500]}"
             query = """
             UPDATE expokossodo_consultas 
             SET resumen = %s 
-            WHERE id = %s
+            WHERE id = %s AND resumen LIKE %s
             """
-            cursor.execute(query, (error_resumen, consulta_id))
+            cursor.execute(query, (error_resumen, consulta_id, f"{PREFIJO_EN_PROCESO}%"))
+            if cursor.rowcount == 0:
+                self.connection.rollback()
+                logger.warning("Consulta ID %s ya no está reclamada, no se marca error", consulta_id)
+                return False
+            if self.indices_resumen_disponibles():
+                self._borrar_indices_resumen(cursor, consulta_id)
             self.connection.commit()
-            logger.warning(f"Marcado error en consulta ID: {consulta_id}")
+            logger.warning("Marcado error en consulta ID: %s", consulta_id)
             return True
         except Error as e:
-            logger.error(f"Error marcando error para ID {consulta_id}: {e}")
+            logger.exception("Error marcando error para ID %s: %s", consulta_id, e)
             self.connection.rollback()
             return False
         finally:
@@ -110,9 +444,18 @@ class DatabaseService:
                 SELECT COUNT(*) as procesadas 
                 FROM expokossodo_consultas 
                 WHERE uso_transcripcion = 1 AND resumen IS NOT NULL AND resumen != ''
+                AND resumen NOT LIKE 'EN_PROCESO:%'
             """)
             stats['procesadas'] = cursor.fetchone()['procesadas']
             
+            # Consultas reclamadas por un proceso en curso
+            cursor.execute("""
+                SELECT COUNT(*) as en_proceso 
+                FROM expokossodo_consultas 
+                WHERE uso_transcripcion = 1 AND resumen LIKE 'EN_PROCESO:%'
+            """)
+            stats['en_proceso'] = cursor.fetchone()['en_proceso']
+            
             # Consultas pendientes
             cursor.execute("""
                 SELECT COUNT(*) as pendientes 
@@ -129,10 +472,140 @@ class DatabaseService:
             """)
             stats['errores'] = cursor.fetchone()['errores']
             
+            self._terminar_lectura()
             return stats
             
         except Error as e:
-            logger.error(f"Error obteniendo estadísticas: {e}")
+            logger.exception("Error obteniendo estadísticas: %s", e)
+            raise
+        finally:
+            cursor.close()
+    
+    def backfill_indices_resumen(self, desde_id: int = 0, tamano_lote: int = 200,
+                                 reindexar: bool = False) -> Dict:
+        """
+        Normaliza los resúmenes existentes en las tablas laterales y los compacta.
+        Omite las consultas ya indexadas (salvo reindexar=True) y confirma por lote,
+        así que puede reanudarse desde el último ID registrado en el log.
+        """
+        stats = {"procesadas": 0, "invalidas": 0, "modificadas_durante_backfill": 0,
+                 "lotes": 0, "ultimo_id": desde_id}
+        ultimo_id = desde_id
+        filtro_indexadas = "" if reindexar else "AND g.consulta_id IS NULL"
+        
+        while True:
+            cursor = self.connection.cursor(dictionary=True)
+            try:
+                cursor.execute(f"""
+                    SELECT c.id, c.resumen
+                    FROM expokossodo_consultas c
+                    LEFT JOIN {TABLA_RESUMEN_GENERAL} g ON g.consulta_id = c.id
+                    WHERE c.id > %s AND c.uso_transcripcion = 1
+                    AND c.resumen IS NOT NULL AND c.resumen != ''
+                    AND c.resumen NOT LIKE %s AND c.resumen NOT LIKE %s
+                    {filtro_indexadas}
+                    ORDER BY c.id ASC
+                    LIMIT %s
+                """, (ultimo_id, 'ERROR_PROCESAMIENTO:%', PREFIJO_EN_PROCESO + '%', tamano_lote))
+                filas = cursor.fetchall()
+            finally:
+                cursor.close()
+            
+            if not filas:
+                break
+            
+            cursor = self.connection.cursor()
+            try:
+                for fila in filas:
+                    try:
+                        resumen_dict = json.loads(fila['resumen'])
+                    except ValueError:
+                        stats["invalidas"] += 1
+                        continue
+                    if not isinstance(resumen_dict, dict):
+                        stats["invalidas"] += 1
+                        continue
+                    
+                    # Bloquea la fila sólo si conserva el resumen leído: si otro proceso
+                    # lo regeneró entretanto, ese resumen (y sus índices) prevalece
+                    cursor.execute(
+                        "SELECT id FROM expokossodo_consultas WHERE id = %s AND resumen = %s FOR UPDATE",
+                        (fila['id'], fila['resumen'])
+                    )
+                    if cursor.fetchone() is None:
+                        stats["modificadas_durante_backfill"] += 1
+                        continue
+                    
+                    resumen_compacto = serializar_resumen(resumen_dict)
+                    if resumen_compacto != fila['resumen']:
+                        cursor.execute(
+                            "UPDATE expokossodo_consultas SET resumen = %s WHERE id = %s",
+                            (resumen_compacto, fila['id'])
+                        )
+                    self._escribir_indices_resumen(cursor, fila['id'], resumen_dict)
+                    stats["procesadas"] += 1
+                self.connection.commit()
+            except Error as e:
+                logger.exception("Error en backfill de índices de resumen: %s", e)
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            
+            ultimo_id = filas[-1]['id']
+            stats["lotes"] += 1
+            stats["ultimo_id"] = ultimo_id
+            logger.info("Backfill de índices: lote %s confirmado hasta ID %s", stats['lotes'], ultimo_id)
+        
+        return stats
+    
+    def buscar_consultas(self, equipo: Optional[str] = None, requerimiento: Optional[str] = None,
+                         asesor: Optional[str] = None, limite: int = 50) -> List[Dict]:
+        """
+        Busca consultas usando las tablas laterales: asesor por prefijo del nombre;
+        equipo y requerimiento por palabras, cada una como prefijo de un token
+        (p. ej. 'CX23' encuentra 'Microscopio Olympus CX23').
+        """
+        condiciones = []
+        params = []
+        
+        if asesor:
+            condiciones.append("g.asesor_nombre LIKE %s")
+            params.append(_patron_prefijo(asesor))
+        
+        for campo, termino in (("equipos_modelos", equipo), ("requerimientos_cliente", requerimiento)):
+            if not termino:
+                continue
+            tokens = tokenizar_valor(termino)
+            if not tokens:
+                raise ValueError(f"Término de búsqueda sin palabras válidas: {termino}")
+            for token in tokens:
+                condiciones.append(
+                    f"g.consulta_id IN (SELECT consulta_id FROM {TABLA_RESUMEN_TOKENS} "
+                    f"WHERE campo = %s AND token LIKE %s)"
+                )
+                params.extend([campo, _patron_prefijo(token)])
+        
+        if not condiciones:
+            raise ValueError("Se requiere al menos un criterio de búsqueda")
+        
+        cursor = self.connection.cursor(dictionary=True)
+        try:
+            query = f"""
+            SELECT g.consulta_id AS id, c.registro_id, g.asesor_nombre,
+                   c.fecha_consulta, g.resumen_general
+            FROM {TABLA_RESUMEN_GENERAL} g
+            JOIN expokossodo_consultas c ON c.id = g.consulta_id
+            WHERE {" AND ".join(condiciones)}
+            ORDER BY c.fecha_consulta DESC
+            LIMIT %s
+            """
+            cursor.execute(query, (*params, limite))
+            consultas = cursor.fetchall()
+            self._terminar_lectura()
+            return consultas
+        except Error as e:
+            logger.exception("Error buscando consultas: %s", e)
             raise
         finally:
             cursor.close()
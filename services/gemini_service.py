@@ -1,8 +1,8 @@
-import google.generativeai as genai
 import json
 import time
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 from typing import Dict, Optional
 import re
@@ -11,19 +11,42 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# El SDK de Gemini es pesado: se importa y configura una sola vez por proceso
+_genai = None
+_genai_api_key = None
+_genai_lock = threading.Lock()
+
+def _cargar_genai(api_key: str):
+    global _genai, _genai_api_key
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            _genai = genai
+        if _genai_api_key != api_key:
+            _genai.configure(api_key=api_key)
+            _genai_api_key = api_key
+        return _genai
+
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_API')
         self.model_name = "gemini-2.0-flash-exp"
         self.max_retries = int(os.getenv('MAX_RETRIES', 5))
         self.rate_limit_delay = 60 / int(os.getenv('RATE_LIMIT_REQUESTS_PER_MINUTE', 60))
+        self.test_conexion_ttl = int(os.getenv('TEST_GEMINI_TTL_SECONDS', 300))
+        self.test_conexion_ttl_error = int(os.getenv('TEST_GEMINI_TTL_ERROR_SECONDS', 15))
+        self._estado_conexion = None
+        self._estado_conexion_momento = 0.0
+        self._estado_conexion_expira = 0.0
+        self._estado_conexion_lock = threading.Lock()
+        self._sondeo_en_curso = None
         
         if not self.api_key:
             raise ValueError("GOOGLE_API key no encontrada en variables de entorno")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(self.model_name)
-        logger.info(f"GeminiService inicializado con modelo: {self.model_name}")
+        self.genai = _cargar_genai(self.api_key)
+        self.model = self.genai.GenerativeModel(self.model_name)
+        logger.info("GeminiService inicializado con modelo: %s", self.model_name)
     
     def _construir_prompt_tecnico(self, consulta_texto: str) -> str:
         return f"""
@@ -80,12 +103,12 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
         
         for campo in campos_requeridos:
             if campo not in respuesta_json:
-                logger.error(f"Campo faltante en respuesta: {campo}")
+                logger.error("Campo faltante en respuesta: %s", campo)
                 return False
             
             # Verificar que los arrays sean realmente arrays
             if campo != "resumen_general" and not isinstance(respuesta_json[campo], list):
-                logger.error(f"Campo {campo} no es una lista")
+                logger.error("Campo %s no es una lista", campo)
                 return False
         
         return True
@@ -93,14 +116,16 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
     def generar_resumen(self, consulta_texto: str, consulta_id: int) -> Optional[str]:
         """Genera resumen usando Gemini con reintentos automáticos"""
         if not consulta_texto or len(consulta_texto.strip()) == 0:
-            logger.warning(f"Consulta vacía para ID: {consulta_id}")
+            logger.warning("Consulta vacía para ID: %s", consulta_id)
             return None
         
         prompt = self._construir_prompt_tecnico(consulta_texto)
         
         for intento in range(1, self.max_retries + 1):
             try:
-                logger.info(f"Generando resumen para consulta {consulta_id} - Intento {intento}")
+                logger.info("Generando resumen para consulta %s - Intento %d", consulta_id, intento,
+                            extra={"consulta_id": consulta_id, "stage": "generacion", "muestreo": True})
+                inicio_intento = time.time()
                 
                 # Rate limiting
                 time.sleep(self.rate_limit_delay)
@@ -108,7 +133,7 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
                 # Generar contenido
                 response = self.model.generate_content(
                     prompt,
-                    generation_config=genai.types.GenerationConfig(
+                    generation_config=self.genai.types.GenerationConfig(
                         temperature=0.1,
                         max_output_tokens=4096,
                     )
@@ -125,18 +150,20 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
                 if not self._validar_estructura_respuesta(resumen_dict):
                     raise ValueError("Estructura de respuesta inválida")
                 
-                # Convertir a JSON string para almacenar
-                resumen_final = json.dumps(resumen_dict, ensure_ascii=False, indent=2)
+                # Convertir a JSON string; el formato de almacenamiento lo define DatabaseService
+                resumen_final = json.dumps(resumen_dict, ensure_ascii=False)
                 
-                logger.info(f"Resumen generado exitosamente para consulta {consulta_id}")
+                logger.info("Resumen generado exitosamente para consulta %s", consulta_id,
+                            extra={"consulta_id": consulta_id, "stage": "generacion",
+                                   "duration": round(time.time() - inicio_intento, 3), "muestreo": True})
                 return resumen_final
                 
             except json.JSONDecodeError as e:
-                logger.error(f"Error JSON en intento {intento} para consulta {consulta_id}: {e}")
-                logger.debug(f"Contenido problemático: {response.text[:500]}...")
+                logger.exception("Error JSON en intento %s para consulta %s: %s", intento, consulta_id, e)
+                logger.debug("Contenido problemático: %.500s...", response.text)
                 
             except Exception as e:
-                logger.error(f"Error en intento {intento} para consulta {consulta_id}: {e}")
+                logger.exception("Error en intento %s para consulta %s: %s", intento, consulta_id, e)
                 
                 # Si es el último intento, re-lanzar la excepción
                 if intento == self.max_retries:
@@ -144,10 +171,10 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
                 
                 # Esperar antes del siguiente intento (backoff exponencial)
                 tiempo_espera = min(60, 2 ** intento)
-                logger.info(f"Esperando {tiempo_espera}s antes del siguiente intento...")
+                logger.info("Esperando %ss antes del siguiente intento...", tiempo_espera)
                 time.sleep(tiempo_espera)
         
-        logger.error(f"Falló generación de resumen para consulta {consulta_id} después de {self.max_retries} intentos")
+        logger.error("Falló generación de resumen para consulta %s después de %s intentos", consulta_id, self.max_retries)
         return None
     
     def test_conexion(self) -> bool:
@@ -156,5 +183,51 @@ RESPONDE ÚNICAMENTE CON EL JSON, SIN TEXTO ADICIONAL.
             response = self.model.generate_content("Responde solo: OK")
             return response.text.strip().upper() == "OK"
         except Exception as e:
-            logger.error(f"Error en test de conexión: {e}")
-            return False
\ No newline at end of file
+            logger.exception("Error en test de conexión: %s", e)
+            return False
+    
+    def test_conexion_cacheado(self) -> Dict:
+        """
+        Prueba la conexión reutilizando el resultado: TEST_GEMINI_TTL_SECONDS si fue
+        exitosa, TEST_GEMINI_TTL_ERROR_SECONDS si falló. La prueba en vivo se hace
+        fuera del lock y una sola a la vez; las llamadas concurrentes devuelven el
+        último resultado o esperan al sondeo en curso si aún no hay ninguno.
+        """
+        with self._estado_conexion_lock:
+            ahora = time.time()
+            vigente = self._estado_conexion is not None and ahora < self._estado_conexion_expira
+            if vigente or (self._sondeo_en_curso is not None and self._estado_conexion is not None):
+                return self._estado_conexion_respuesta(ahora, en_cache=True)
+            
+            sondeo = self._sondeo_en_curso
+            propio = sondeo is None
+            if propio:
+                sondeo = self._sondeo_en_curso = threading.Event()
+        
+        if not propio:
+            sondeo.wait(timeout=30)
+            with self._estado_conexion_lock:
+                return self._estado_conexion_respuesta(time.time(), en_cache=True)
+        
+        conectado = False
+        try:
+            conectado = self.test_conexion()
+        finally:
+            with self._estado_conexion_lock:
+                ahora = time.time()
+                self._estado_conexion = conectado
+                self._estado_conexion_momento = ahora
+                ttl = self.test_conexion_ttl if conectado else self.test_conexion_ttl_error
+                self._estado_conexion_expira = ahora + ttl
+                self._sondeo_en_curso = None
+            sondeo.set()
+        
+        with self._estado_conexion_lock:
+            return self._estado_conexion_respuesta(time.time(), en_cache=False)
+    
+    def _estado_conexion_respuesta(self, ahora: float, en_cache: bool) -> Dict:
+        return {
+            "conectado": bool(self._estado_conexion),
+            "en_cache": en_cache,
+            "edad_segundos": round(ahora - self._estado_conexion_momento, 1) if self._estado_conexion is not None else None
+        }
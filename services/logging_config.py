@@ -0,0 +1,174 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+# Campos de contexto que se copian al registro JSON cuando vienen en `extra`
+CAMPOS_CONTEXTO = ("consulta_id", "stage", "duration")
+
+_listener = None
+_ruta = None
+_rol = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON con su contexto estructurado"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        registro = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for campo in CAMPOS_CONTEXTO:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                registro[campo] = valor
+        if record.exc_info:
+            registro["exception"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class MuestreoFilter(logging.Filter):
+    """
+    Deja pasar 1 de cada N registros INFO marcados con extra={'muestreo': True}.
+    El contador es independiente por plantilla de mensaje.
+    """
+
+    def __init__(self, tasa: int):
+        super().__init__()
+        self.tasa = max(1, tasa)
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.tasa == 1 or record.levelno != logging.INFO or not getattr(record, "muestreo", False):
+            return True
+        clave = (record.name, record.msg)
+        with self._lock:
+            contador = self._contadores.get(clave, 0)
+            self._contadores[clave] = contador + 1
+            return contador % self.tasa == 0
+
+
+class QueueHandlerEstructurado(logging.handlers.QueueHandler):
+    """
+    QueueHandler que conserva exc_info: el prepare() estándar lo incrusta en el
+    mensaje y lo borra, y JsonFormatter no podría emitirlo en su propio campo.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+MODOS_ROTACION = ("size", "time", "external")
+
+
+def _ruta_por_proceso(ruta: str, rol: str) -> str:
+    """resumen_llamadas.jsonl -> resumen_llamadas.web-1234.jsonl"""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{rol}-{os.getpid()}{extension}"
+
+
+def _crear_file_handler(ruta: str, rol: str) -> logging.Handler:
+    """
+    Los handlers con rotación interna no son seguros entre procesos: con
+    LOG_ROTATION=size|time (size por defecto) cada proceso escribe su propio
+    archivo. LOG_ROTATION=external comparte `ruta` entre procesos y sólo sirve
+    si el host rota el archivo (logrotate con deploy/logrotate.conf);
+    WatchedFileHandler lo reabre tras rotarlo.
+    """
+    rotacion = os.getenv('LOG_ROTATION', 'size').lower()
+    if rotacion not in MODOS_ROTACION:
+        raise ValueError(
+            f"LOG_ROTATION inválido: {rotacion!r} (valores: {', '.join(MODOS_ROTACION)})"
+        )
+    if rotacion == 'external':
+        return logging.handlers.WatchedFileHandler(ruta, encoding='utf-8')
+    ruta = _ruta_por_proceso(ruta, rol)
+    if rotacion == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            ruta,
+            when=os.getenv('LOG_ROTATION_WHEN', 'midnight'),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', 7)),
+            encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        ruta,
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', 7)),
+        encoding='utf-8'
+    )
+
+
+def configurar_logging(ruta: str = 'resumen_llamadas.jsonl', rol: str = 'web') -> None:
+    """
+    Configura logging asíncrono: los hilos de procesamiento sólo encolan
+    registros y un QueueListener en segundo plano los escribe en archivo
+    (JSON, separado del histórico en texto resumen_llamadas.log) y consola.
+    `rol` identifica el proceso (web, watcher, backfill) en el nombre de
+    archivo cuando la rotación es interna. Es idempotente.
+    """
+    global _listener, _ruta, _rol
+    if _listener is not None:
+        return
+    primera_vez = _ruta is None
+    _ruta = ruta
+    _rol = rol
+
+    nivel = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+
+    file_handler = _crear_file_handler(ruta, rol)
+    file_handler.setFormatter(JsonFormatter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    cola = queue.Queue(-1)
+    queue_handler = QueueHandlerEstructurado(cola)
+    queue_handler.addFilter(MuestreoFilter(int(os.getenv('LOG_SAMPLE_RATE', 1))))
+
+    root = logging.getLogger()
+    root.setLevel(nivel)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        cola, file_handler, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    if primera_vez:
+        atexit.register(detener_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+
+
+def _reiniciar_en_hijo() -> None:
+    """
+    El hilo del listener no sobrevive a fork (gunicorn --preload): cada worker
+    crea su propia cola y listener.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    configurar_logging(_ruta, _rol)
+
+
+def detener_logging() -> None:
+    """Vacía la cola y detiene el listener en segundo plano"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
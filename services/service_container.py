@@ -0,0 +1,53 @@
+import os
+import threading
+import logging
+from .database_service import DatabaseService
+from .gemini_service import GeminiService
+
+logger = logging.getLogger(__name__)
+
+# Instancias de larga vida por proceso (worker). Se crean en el primer uso, nunca
+# al importar, para que `gunicorn --preload` no herede clientes del proceso maestro.
+_lock = threading.Lock()
+_pid = None
+_gemini_service = None
+_local = threading.local()
+
+def _verificar_proceso():
+    """Descarta las instancias heredadas si el proceso actual es un fork"""
+    global _pid, _gemini_service
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _gemini_service = None
+        _local.__dict__.clear()
+
+def get_gemini_service() -> GeminiService:
+    """GeminiService compartido por todos los hilos del proceso"""
+    global _gemini_service
+    with _lock:
+        _verificar_proceso()
+        if _gemini_service is None:
+            _gemini_service = GeminiService()
+        return _gemini_service
+
+def get_database_service() -> DatabaseService:
+    """DatabaseService por hilo; las conexiones MySQL no son thread-safe"""
+    with _lock:
+        _verificar_proceso()
+    db_service = getattr(_local, 'db_service', None)
+    if db_service is None:
+        db_service = DatabaseService()
+        _local.db_service = db_service
+    else:
+        db_service.asegurar_conexion()
+    return db_service
+
+def cerrar_servicios():
+    """Cierra la conexión del hilo actual (p. ej. al apagar el worker)"""
+    db_service = getattr(_local, 'db_service', None)
+    if db_service is not None:
+        try:
+            db_service.close()
+        except Exception as e:
+            logger.warning("Error cerrando DatabaseService: %s", e)
+        _local.db_service = None
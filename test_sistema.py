@@ -116,12 +116,216 @@ def test_consultas_pendientes():
         print(f"Error obteniendo consultas: {e}")
         return False
 
+def test_normalizacion_resumen():
+    """Verifica normalización, tokens, escape de comodines y escrituras laterales sin BD"""
+    print("\nProbando normalizacion de resumenes (sin conexion)...")
+    from services.database_service import (
+        CAMPOS_LISTA_RESUMEN, TABLA_RESUMEN_TOKENS, _patron_prefijo,
+        normalizar_valor, serializar_resumen, tokenizar_valor
+    )
+    
+    class CursorFalso:
+        def __init__(self):
+            self.sentencias = []
+        def execute(self, sql, params=None):
+            self.sentencias.append((" ".join(sql.split()), params))
+        def executemany(self, sql, filas):
+            for fila in filas:
+                self.execute(sql, fila)
+    
+    try:
+        assert normalizar_valor("  Microscopio   Olympus\tCX23 ") == "microscopio olympus cx23"
+        assert len(normalizar_valor("x" * 300)) == 255
+        
+        assert tokenizar_valor("Microscopio Olympus CX23") == ["microscopio", "olympus", "cx23"]
+        assert tokenizar_valor("Router TP-Link, firmware 1.2.3") == [
+            "router", "tp-link", "tp", "link", "firmware", "1.2.3", "1", "2", "3"
+        ]
+        assert tokenizar_valor("Cotización urgente") == ["cotizacion", "urgente"]
+        
+        assert _patron_prefijo("CX23") == "cx23%"
+        assert _patron_prefijo("50%_off") == "50\\%\\_off%"
+        assert _patron_prefijo("a\\b") == "a\\\\b%"
+        
+        assert serializar_resumen({"a": ["ñ"]}) == '{"a":["ñ"]}'
+        
+        db_service = DatabaseService.__new__(DatabaseService)
+        cursor = CursorFalso()
+        resumen = {campo: [] for campo in CAMPOS_LISTA_RESUMEN}
+        resumen["resumen_general"] = "Consulta sobre microscopio"
+        resumen["equipos_modelos"] = ["Microscopio Olympus CX23", "  ", "Olympus CX23"]
+        db_service._escribir_indices_resumen(cursor, 7, resumen)
+        
+        borrados = [p for sql, p in cursor.sentencias if sql.startswith("DELETE")]
+        assert len(borrados) == len(CAMPOS_LISTA_RESUMEN) + 2 and all(p == (7,) for p in borrados)
+        
+        filas_equipos = [p for sql, p in cursor.sentencias if "INTO expokossodo_resumen_equipos_modelos" in sql]
+        assert filas_equipos == [
+            (7, 0, "Microscopio Olympus CX23", "microscopio olympus cx23"),
+            (7, 2, "Olympus CX23", "olympus cx23")
+        ]
+        
+        tokens = [p for sql, p in cursor.sentencias if f"INTO {TABLA_RESUMEN_TOKENS}" in sql]
+        assert tokens == [(7, "equipos_modelos", t) for t in ("microscopio", "olympus", "cx23")]
+        
+        print("Normalizacion de resumenes correcta")
+        return True
+    except AssertionError as e:
+        print(f"Fallo en normalizacion de resumenes: {e!r}")
+        return False
+
+def test_watcher_sondeo():
+    """Verifica con una BD falsa que el watcher no relee lo encolado ni pierde ids tardíos"""
+    print("\nProbando sondeo del watcher (sin conexion)...")
+    import queue
+    from services import change_watcher
+    
+    class BDFalsa:
+        def __init__(self, filas):
+            self.filas = filas  # id -> timestamp
+        def get_marca_maxima(self, columna_timestamp=None):
+            if columna_timestamp:
+                return max(self.filas.values())
+            return max(self.filas)
+        def get_consultas_nuevas(self, desde_id, hasta, limite, columna_timestamp=None,
+                                 desde_timestamp=None, excluir_ids=()):
+            if columna_timestamp:
+                desde_timestamp = desde_timestamp or 0
+                claves = sorted((ts, i) for i, ts in self.filas.items()
+                                if (ts, i) > (desde_timestamp, desde_id) and ts <= hasta)
+            else:
+                claves = [(None, i) for i in sorted(self.filas) if desde_id < i <= hasta]
+            return [{"id": i, "consulta": "texto de prueba", "marca_timestamp": ts}
+                    for ts, i in claves if i not in excluir_ids][:limite]
+    
+    original = change_watcher.get_database_service
+    try:
+        # Modo timestamp: varias filas con el mismo timestamp y cola casi llena
+        bd = BDFalsa({1: 100, 2: 100})
+        change_watcher.get_database_service = lambda: bd
+        watcher = change_watcher.ConsultaWatcher()
+        watcher.columna_timestamp = "updated_at"
+        watcher.cola = queue.Queue(maxsize=3)
+        assert watcher._sondear_rango(3) is False
+        assert watcher.cola.qsize() == 2
+        libres = watcher.cola.maxsize - watcher.cola.qsize()
+        assert watcher._sondear_rango(libres) is False, "releer lo encolado no es página completa"
+        assert watcher.cola.qsize() == 2
+        
+        # Modo id: un id bajo que confirma después de que la marca lo pasó
+        bd = BDFalsa({5: None, 9: None})
+        watcher = change_watcher.ConsultaWatcher()
+        watcher.columna_timestamp = None
+        watcher.ventana_reescaneo = 10
+        assert watcher._sondear_rango(20) is False and watcher.marca_id == 9
+        bd.filas[7] = None
+        assert watcher._sondear_rango(20) is False
+        encoladas = [watcher.cola.get()["id"] for _ in range(watcher.cola.qsize())]
+        assert encoladas == [5, 9, 7], encoladas
+        
+        print("Sondeo del watcher correcto")
+        return True
+    except AssertionError as e:
+        print(f"Fallo en sondeo del watcher: {e!r}")
+        return False
+    finally:
+        change_watcher.get_database_service = original
+
+_MEDICION_ANTES_ARRANQUE = """
+import time
+t = time.perf_counter()
+import google.generativeai  # antes app.py importaba el SDK al cargar
+import app
+print(time.perf_counter() - t)
+"""
+
+_MEDICION_ANTES_REQUEST = """
+import os, time
+from dotenv import load_dotenv
+import google.generativeai as genai
+from services.database_service import DatabaseService
+
+def request():
+    # Lo que hacía cada request: BatchProcessor() -> DatabaseService() + GeminiService()
+    load_dotenv()
+    DatabaseService().close()
+    genai.configure(api_key=os.getenv('GOOGLE_API'))
+    genai.GenerativeModel("gemini-2.0-flash-exp")
+
+request()
+t = time.perf_counter()
+for _ in range({repeticiones}):
+    request()
+print((time.perf_counter() - t) / {repeticiones})
+"""
+
+_MEDICION_DESPUES_ARRANQUE = """
+import time
+t = time.perf_counter()
+import app
+print(time.perf_counter() - t)
+"""
+
+_MEDICION_DESPUES_PRIMER_REQUEST = """
+import time
+import app
+from services.service_container import get_database_service, get_gemini_service
+t = time.perf_counter()
+get_gemini_service()
+get_database_service()
+print(time.perf_counter() - t)
+"""
+
+_MEDICION_DESPUES_REQUEST = """
+import time
+import app
+from services.service_container import get_database_service, get_gemini_service
+get_gemini_service()
+get_database_service()
+t = time.perf_counter()
+for _ in range({repeticiones}):
+    get_gemini_service()
+    get_database_service()
+print((time.perf_counter() - t) / {repeticiones})
+"""
+
+def _medir_en_subproceso(codigo: str) -> float:
+    """Ejecuta el código en un intérprete nuevo y devuelve el número que imprime al final"""
+    import subprocess
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(salida.stdout.strip().splitlines()[-1])
+
+def test_tiempos_arranque():
+    """Mide arranque en frío y overhead por request, antes y después de compartir servicios"""
+    print("\nMidiendo tiempos de arranque y overhead por request (cada medicion en un proceso nuevo)...")
+    repeticiones = 10
+    
+    try:
+        antes_arranque = _medir_en_subproceso(_MEDICION_ANTES_ARRANQUE)
+        despues_arranque = _medir_en_subproceso(_MEDICION_DESPUES_ARRANQUE)
+        primer_request = _medir_en_subproceso(_MEDICION_DESPUES_PRIMER_REQUEST)
+        antes_request = _medir_en_subproceso(_MEDICION_ANTES_REQUEST.format(repeticiones=repeticiones))
+        despues_request = _medir_en_subproceso(_MEDICION_DESPUES_REQUEST.format(repeticiones=repeticiones))
+        
+        print(f"Arranque en frio - antes (app + SDK Gemini): {antes_arranque:.3f}s")
+        print(f"Arranque en frio - despues (SDK diferido):   {despues_arranque:.3f}s")
+        print(f"Primer request del worker (crea servicios):  {primer_request:.3f}s")
+        print(f"Overhead por request - antes (servicios nuevos):     {antes_request * 1000:.2f}ms")
+        print(f"Overhead por request - despues (servicios compartidos): {despues_request * 1000:.2f}ms")
+        return True
+    except Exception as e:
+        print(f"Error midiendo tiempos: {e}")
+        return False
+
 def run_all_tests():
     """Ejecuta todas las pruebas"""
     print("INICIANDO PRUEBAS DEL SISTEMA DE RESUMENES")
     print("=" * 60)
     
     tests = [
+        ("Normalización de Resumen", test_normalizacion_resumen),
+        ("Sondeo del Watcher", test_watcher_sondeo),
         ("Base de Datos", test_database_connection),
         ("Gemini API", test_gemini_connection),
         ("Consultas Pendientes", test_consultas_pendientes),
@@ -157,7 +361,7 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Pruebas del sistema de resúmenes")
-    parser.add_argument("--test", choices=["db", "gemini", "pending", "prompt", "all"], 
+    parser.add_argument("--test", choices=["db", "gemini", "pending", "prompt", "normalize", "watcher", "startup", "all"], 
                        default="all", help="Tipo de prueba a ejecutar")
     
     args = parser.parse_args()
@@ -170,5 +374,11 @@ if __name__ == "__main__":
         test_consultas_pendientes()
     elif args.test == "prompt":
         test_prompt_ejemplo()
+    elif args.test == "normalize":
+        test_normalizacion_resumen()
+    elif args.test == "watcher":
+        test_watcher_sondeo()
+    elif args.test == "startup":
+        test_tiempos_arranque()
     else:
         run_all_tests()
\ No newline at end of file